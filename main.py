@@ -8,7 +8,6 @@ Model Context Protocolを使用して、APIの変更を検出し、詳細な分
 
 import os
 import sys
-import json
 from pathlib import Path
 from fastmcp import FastMCP
 
@@ -17,8 +16,9 @@ current_dir = Path(__file__).parent
 sys.path.append(str(current_dir))
 
 # 自作ツールのインポート
-from tools.differ import OpenAPIDiffer
-from tools.analyzer import OpenAPIAnalyzer
+# キャッシュを呼び出し間で再利用するため、モジュール単位で共有されるインスタンスを使用する
+from tools.differ import _DEFAULT_DIFFER as differ
+from tools.analyzer import _DEFAULT_ANALYZER as analyzer
 
 # MCPアプリケーションの作成
 app = FastMCP("OpenAPI YAML Analyzer 🔍")
@@ -40,7 +40,6 @@ def analyze_staged_git_diff(repo_path: str, yaml_path: str) -> dict:
         if not os.path.exists(os.path.join(repo_path, ".git")):
             return {"error": f"Gitリポジトリが見つかりません: {repo_path}"}
         
-        differ = OpenAPIDiffer()
         diff = differ.compare_staged_changes(
             git_repo_path=repo_path,
             yaml_path=yaml_path
@@ -73,7 +72,6 @@ def find_schema_usages(repo_path: str, yaml_path: str, schema_name: str) -> dict
         with open(full_yaml_path, 'r', encoding='utf-8') as file:
             yaml_content = file.read()
         
-        analyzer = OpenAPIAnalyzer()
         result = analyzer.analyze_schema_impact(yaml_content, schema_name)
         
         # 結果を見やすい形式に整形
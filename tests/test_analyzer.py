@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+OpenAPIAnalyzer のテスト
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# プロジェクトのルートをインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tools.analyzer import OpenAPIAnalyzer
+
+
+CYCLIC_SPEC = """
+openapi: 3.0.0
+paths:
+  /users:
+    get:
+      operationId: listUsers
+      responses:
+        '200':
+          description: OK
+          content:
+            application/json:
+              schema:
+                type: array
+                items:
+                  $ref: '#/components/schemas/User'
+  /groups:
+    post:
+      operationId: createGroup
+      requestBody:
+        content:
+          application/json:
+            schema:
+              $ref: '#/components/schemas/Group'
+      responses:
+        '201':
+          description: Created
+  /nodes:
+    get:
+      operationId: getNode
+      parameters:
+        - name: filter
+          in: query
+          schema:
+            $ref: '#/components/schemas/Node'
+      responses:
+        '200':
+          description: OK
+components:
+  schemas:
+    User:
+      type: object
+      properties:
+        group:
+          $ref: '#/components/schemas/Group'
+    Group:
+      type: object
+      properties:
+        members:
+          type: array
+          items:
+            $ref: '#/components/schemas/User'
+        owner:
+          allOf:
+            - $ref: '#/components/schemas/Owner'
+    Owner:
+      type: object
+      properties:
+        name:
+          type: string
+    Node:
+      type: object
+      properties:
+        children:
+          type: array
+          items:
+            $ref: '#/components/schemas/Node'
+    Unused:
+      type: object
+      properties:
+        self:
+          $ref: '#/components/schemas/Unused'
+"""
+
+
+def _endpoints(result):
+    """影響を受けるエンドポイントを (メソッド, パス) の集合で返す"""
+    return {(e["method"], e["path"]) for e in result["affected_endpoints"]}
+
+
+class TestAnalyzeSchemaImpact(unittest.TestCase):
+    """analyze_schema_impact のテスト"""
+    
+    def setUp(self):
+        self.analyzer = OpenAPIAnalyzer()
+    
+    def test_cyclic_schemas(self):
+        """相互参照するスキーマは、どちらを起点にしても両方のエンドポイントに影響する"""
+        for name in ("User", "Group"):
+            result = self.analyzer.analyze_schema_impact(CYCLIC_SPEC, name)
+            self.assertEqual(_endpoints(result), {("GET", "/users"), ("POST", "/groups")}, name)
+    
+    def test_schema_reached_through_cycle(self):
+        """循環の先にあるスキーマも参照として検出される"""
+        result = self.analyzer.analyze_schema_impact(CYCLIC_SPEC, "Owner")
+        self.assertEqual(_endpoints(result), {("GET", "/users"), ("POST", "/groups")})
+        self.assertEqual(result["usage_details"]["response"][0]["status_code"], "200")
+        self.assertEqual(result["usage_details"]["request_body"][0]["mime_type"], "application/json")
+    
+    def test_self_referencing_schema(self):
+        """自己参照するスキーマは自身を使用するエンドポイントにのみ影響する"""
+        result = self.analyzer.analyze_schema_impact(CYCLIC_SPEC, "Node")
+        self.assertEqual(_endpoints(result), {("GET", "/nodes")})
+        self.assertEqual(result["affected_endpoints"][0]["usage_locations"], ["parameter (filter)"])
+    
+    def test_unused_self_referencing_schema(self):
+        """どのエンドポイントからも参照されないスキーマは影響なしとなる"""
+        result = self.analyzer.analyze_schema_impact(CYCLIC_SPEC, "Unused")
+        self.assertEqual(result["affected_endpoints"], [])
+    
+    def test_repeated_analysis_uses_same_result(self):
+        """同じ仕様を繰り返し分析しても結果が変わらない"""
+        first = self.analyzer.analyze_schema_impact(CYCLIC_SPEC, "Group")
+        second = self.analyzer.analyze_schema_impact(CYCLIC_SPEC, "Group")
+        self.assertEqual(first, second)
+    
+    def test_null_components(self):
+        """components や schemas が空でもエラーにならない"""
+        for components in ("components:\n", "components:\n  schemas:\n"):
+            spec = "openapi: 3.0.0\npaths:\n  /a:\n    get:\n      responses: {}\n" + components
+            result = self.analyzer.analyze_schema_impact(spec, "User")
+            self.assertEqual(result["affected_endpoints"], [])
+    
+    def test_invalid_yaml(self):
+        """YAMLの解析に失敗した場合はエラー情報を返す"""
+        result = self.analyzer.analyze_schema_impact("paths: [", "User")
+        self.assertIn("error", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
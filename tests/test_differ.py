@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+OpenAPIDiffer のGitリポジトリ連携のテスト
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# プロジェクトのルートをインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tools import differ
+from tools.differ import OpenAPIDiffer, _Repo
+
+
+BASE_SPEC = """
+openapi: 3.0.0
+paths:
+  /users:
+    get:
+      responses: {}
+components:
+  schemas:
+    User:
+      type: object
+"""
+
+UPDATED_SPEC = BASE_SPEC.replace("  /users:\n", "  /groups:\n    get:\n      responses: {}\n  /users:\n")
+
+# コミットに必要な情報（利用者のGit設定に依存しないようにする）
+_GIT_ENV = {
+    "GIT_AUTHOR_NAME": "test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+}
+
+
+class _GitRepoTestMixin:
+    """一時的なGitリポジトリを作成して compare_staged_changes などを検証するテスト"""
+    
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.realpath(self._tmp.name)
+        self._git("init", "-q")
+        self._write("api/openapi.yaml", BASE_SPEC)
+        self._git("add", "api/openapi.yaml")
+        self._git("commit", "-q", "-m", "initial")
+        self.differ = OpenAPIDiffer()
+    
+    def tearDown(self):
+        self._tmp.cleanup()
+    
+    def _git(self, *args):
+        """テスト用リポジトリでgitコマンドを実行する"""
+        env = dict(os.environ, **_GIT_ENV)
+        return subprocess.run(
+            ["git", *args], cwd=self.repo_path, env=env, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    
+    def _write(self, rel_path, content):
+        """作業ツリーにファイルを書き込む"""
+        path = os.path.join(self.repo_path, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    
+    def test_staged_modification(self):
+        """ステージングされた変更が差分として検出される"""
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("add", "api/openapi.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "api/openapi.yaml")
+        self.assertEqual(list(result["paths"]["added"]), ["/groups"])
+        self.assertEqual(result["paths"]["removed"], {})
+    
+    def test_staged_new_file(self):
+        """HEADに存在しない新規ファイルは全体が追加として扱われる"""
+        self._write("api/new.yaml", BASE_SPEC)
+        self._git("add", "api/new.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "api/new.yaml")
+        self.assertEqual(list(result["paths"]["added"]), ["/users"])
+        self.assertEqual(list(result["components"]["schemas"]["added"]), ["User"])
+    
+    def test_staged_deleted_file(self):
+        """削除がステージングされたファイルは全体が削除として扱われる"""
+        self._git("rm", "-q", "api/openapi.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "api/openapi.yaml")
+        self.assertEqual(list(result["paths"]["removed"]), ["/users"])
+        self.assertEqual(list(result["components"]["schemas"]["removed"]), ["User"])
+    
+    def test_staged_mode_change(self):
+        """ファイルモードだけの変更もステージングされた変更として扱われる"""
+        self._git("update-index", "--chmod=+x", "api/openapi.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "api/openapi.yaml")
+        self.assertEqual(result["paths"]["added"], {})
+        self.assertEqual(result["paths"]["modified"], {})
+    
+    def test_staged_file_without_head_commit(self):
+        """コミットがまだないリポジトリでは、ステージングされたファイルは追加として扱われる"""
+        self._tmp.cleanup()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.repo_path = os.path.realpath(self._tmp.name)
+        self._git("init", "-q")
+        self._write("openapi.yaml", BASE_SPEC)
+        self._git("add", "openapi.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "openapi.yaml")
+        self.assertEqual(list(result["paths"]["added"]), ["/users"])
+    
+    def test_unstaged_modification(self):
+        """作業ツリーだけの変更はステージングされていないものとしてエラーになる"""
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        
+        with self.assertRaisesRegex(ValueError, "ステージングされていません"):
+            self.differ.compare_staged_changes(self.repo_path, "api/openapi.yaml")
+    
+    def test_untracked_file(self):
+        """追跡されていないファイルはステージングされていないものとしてエラーになる"""
+        self._write("api/untracked.yaml", BASE_SPEC)
+        
+        with self.assertRaisesRegex(ValueError, "ステージングされていません"):
+            self.differ.compare_staged_changes(self.repo_path, "api/untracked.yaml")
+    
+    def test_directory_path(self):
+        """ディレクトリを指定した場合はファイルとして扱わない"""
+        with self.assertRaisesRegex(ValueError, "ステージングされていません"):
+            self.differ.compare_staged_changes(self.repo_path, "api")
+    
+    def test_index_reloaded_between_calls(self):
+        """同じリポジトリへの連続した呼び出しでも最新のインデックスを参照する"""
+        with self.assertRaises(ValueError):
+            self.differ.compare_staged_changes(self.repo_path, "api/openapi.yaml")
+        
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("add", "api/openapi.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "api/openapi.yaml")
+        self.assertEqual(list(result["paths"]["added"]), ["/groups"])
+    
+    def test_absolute_yaml_path(self):
+        """絶対パスで指定されたファイルもリポジトリからの相対パスに変換される"""
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("add", "api/openapi.yaml")
+        
+        yaml_path = os.path.join(self.repo_path, "api", "openapi.yaml")
+        result = self.differ.compare_staged_changes(self.repo_path, yaml_path)
+        self.assertEqual(list(result["paths"]["added"]), ["/groups"])
+    
+    def test_compare_git_revisions(self):
+        """コミット間の差分を比較し、存在しないファイルは空の仕様として扱う"""
+        first = self._git("rev-parse", "HEAD")
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("commit", "-q", "-a", "-m", "update")
+        second = self._git("rev-parse", "HEAD")
+        
+        result = self.differ.compare_git_revisions(self.repo_path, "api/openapi.yaml", first, second)
+        self.assertEqual(list(result["paths"]["added"]), ["/groups"])
+        
+        result = self.differ.compare_git_revisions(self.repo_path, "api", first, second)
+        self.assertEqual(result["paths"]["added"], {})
+    
+    def test_compare_git_revisions_normalizes_path(self):
+        """'./' で始まるパスや絶対パスもリポジトリからの相対パスとして扱う"""
+        first = self._git("rev-parse", "HEAD")
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("commit", "-q", "-a", "-m", "update")
+        
+        for yaml_path in ("./api/openapi.yaml", "api/../api/openapi.yaml", os.path.join(self.repo_path, "api", "openapi.yaml")):
+            result = self.differ.compare_git_revisions(self.repo_path, yaml_path, first, "HEAD")
+            self.assertEqual(list(result["paths"]["added"]), ["/groups"], yaml_path)
+    
+    def test_path_outside_repository(self):
+        """リポジトリの外を指すパスはエラーになる"""
+        outside = os.path.join(os.path.dirname(self.repo_path), "openapi.yaml")
+        for yaml_path in ("../openapi.yaml", outside):
+            with self.assertRaisesRegex(ValueError, "リポジトリの外"):
+                self.differ.compare_git_revisions(self.repo_path, yaml_path, "HEAD", "HEAD")
+            with self.assertRaisesRegex(ValueError, "リポジトリの外"):
+                self.differ.compare_staged_changes(self.repo_path, yaml_path)
+    
+    def test_staged_relative_path_with_dot(self):
+        """'./' で始まるパスでもステージングされた変更を検出する"""
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("add", "api/openapi.yaml")
+        
+        result = self.differ.compare_staged_changes(self.repo_path, "./api/openapi.yaml")
+        self.assertEqual(list(result["paths"]["added"]), ["/groups"])
+    
+    def test_first_commit_with_file(self):
+        """ファイルを最初に追加したコミットを返す"""
+        first = self._git("rev-parse", "HEAD")
+        self._write("api/openapi.yaml", UPDATED_SPEC)
+        self._git("commit", "-q", "-a", "-m", "update")
+        
+        yaml_paths = ("api/openapi.yaml", "./api/openapi.yaml", os.path.join(self.repo_path, "api", "openapi.yaml"))
+        for yaml_path in yaml_paths:
+            self.assertEqual(self.differ.get_first_commit_with_file(self.repo_path, yaml_path), first, yaml_path)
+    
+    def test_bare_repository(self):
+        """ベアリポジトリでは作業ツリーのパスが None になる"""
+        bare_path = os.path.join(self.repo_path, "bare.git")
+        self._git("clone", "-q", "--bare", ".", bare_path)
+        
+        repo = _Repo(bare_path)
+        self.assertIsNone(repo.working_tree_dir)
+        self.assertEqual(repo.read_file("HEAD", "api/openapi.yaml"), BASE_SPEC)
+    
+    def test_repo_cache_evicts_least_recently_used(self):
+        """キャッシュの上限を超えたリポジトリは閉じられて破棄される"""
+        other_path = os.path.join(self.repo_path, "other.git")
+        self._git("clone", "-q", "--bare", ".", other_path)
+        
+        with mock.patch.object(differ, "_REPO_CACHE_SIZE", 1), \
+                mock.patch.object(_Repo, "close", autospec=True) as close:
+            first = self.differ._get_repo(self.repo_path)
+            self.assertIs(self.differ._get_repo(self.repo_path), first)
+            
+            self.differ._get_repo(other_path)
+            close.assert_called_once_with(first)
+            self.assertIsNot(self.differ._get_repo(self.repo_path), first)
+
+class TestDifferGitPython(_GitRepoTestMixin, unittest.TestCase):
+    """GitPython を使用する場合のテスト"""
+    
+    def setUp(self):
+        patcher = mock.patch.object(differ, "pygit2", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+@unittest.skipIf(differ.pygit2 is None, "pygit2 がインストールされていません")
+class TestDifferPygit2(_GitRepoTestMixin, unittest.TestCase):
+    """pygit2 を使用する場合のテスト"""
+
+
+if __name__ == "__main__":
+    unittest.main()
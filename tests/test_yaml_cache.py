@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+YAML解析キャッシュ（tools._yaml_cache）のテスト
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+import yaml
+
+# プロジェクトのルートをインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tools._yaml_cache import fast_load_openapi, load_spec
+
+
+class TestFastLoadOpenAPI(unittest.TestCase):
+    """fast_load_openapi のテスト"""
+    
+    def test_alias_to_anchor_in_skipped_section(self):
+        """読み捨てる x- セクション内のアンカーを参照するエイリアスも展開される"""
+        content = """
+openapi: 3.0.0
+x-common:
+  error: &error_response
+    description: Error
+    content:
+      application/json:
+        schema:
+          $ref: '#/components/schemas/Error'
+  id: &id_schema
+    type: string
+    format: uuid
+paths:
+  /users:
+    get:
+      responses:
+        '500': *error_response
+components:
+  schemas:
+    Error:
+      type: object
+      properties:
+        id: *id_schema
+"""
+        spec = fast_load_openapi(content)
+        full = yaml.safe_load(content)
+        
+        self.assertNotIn("x-common", spec)
+        self.assertEqual(spec["paths"], full["paths"])
+        self.assertEqual(spec["components"], full["components"])
+        self.assertEqual(spec["paths"]["/users"]["get"]["responses"]["500"]["description"], "Error")
+    
+    def test_top_level_merge_key(self):
+        """トップレベルのマージキーで取り込まれた paths も解析される"""
+        content = """
+x-base: &base
+  openapi: 3.0.0
+  paths:
+    /base:
+      get:
+        responses: {}
+<<: *base
+info:
+  title: Merged
+"""
+        spec = fast_load_openapi(content)
+        self.assertEqual(spec, {
+            "openapi": "3.0.0",
+            "paths": {"/base": {"get": {"responses": {}}}}
+        })
+    
+    def test_top_level_merge_key_overridden(self):
+        """マージキーより明示的なキーが優先される"""
+        content = """
+x-base: &base
+  openapi: 3.0.0
+  paths:
+    /base: {}
+<<: *base
+paths:
+  /own: {}
+"""
+        spec = fast_load_openapi(content)
+        self.assertEqual(spec["paths"], yaml.safe_load(content)["paths"])
+        self.assertEqual(spec["openapi"], "3.0.0")
+    
+    def test_components_keeps_only_schemas(self):
+        """components からは schemas だけを取り出す"""
+        content = """
+openapi: 3.0.0
+paths: {}
+components:
+  securitySchemes:
+    token:
+      type: http
+  schemas:
+    User:
+      type: object
+"""
+        spec = fast_load_openapi(content)
+        self.assertEqual(spec["components"], {"schemas": {"User": {"type": "object"}}})
+    
+    def test_null_components(self):
+        """値が空の components はそのまま None として構築される"""
+        spec = fast_load_openapi("openapi: 3.0.0\ncomponents:\n")
+        self.assertEqual(spec, {"openapi": "3.0.0", "components": None})
+    
+    def test_empty_document(self):
+        """空のドキュメントは None を返す"""
+        self.assertIsNone(fast_load_openapi(""))
+    
+    def test_non_mapping_document(self):
+        """トップレベルがマッピングでない場合はドキュメント全体を返す"""
+        self.assertEqual(fast_load_openapi("- a\n- b\n"), ["a", "b"])
+    
+    def test_invalid_yaml(self):
+        """解析に失敗した場合は yaml.YAMLError を送出する"""
+        with self.assertRaises(yaml.YAMLError):
+            fast_load_openapi("paths: [")
+
+
+class TestLoadSpec(unittest.TestCase):
+    """load_spec のテスト"""
+    
+    def test_same_content_is_cached(self):
+        """同じ内容のYAMLは同じ解析結果を返す"""
+        content = "openapi: 3.0.0\npaths:\n  /cached: {}\n"
+        self.assertIs(load_spec(content), load_spec(content))
+    
+    def test_different_content(self):
+        """内容が異なれば別の解析結果を返す"""
+        first = load_spec("openapi: 3.0.0\npaths:\n  /a: {}\n")
+        second = load_spec("openapi: 3.0.0\npaths:\n  /b: {}\n")
+        self.assertEqual(list(first["paths"]), ["/a"])
+        self.assertEqual(list(second["paths"]), ["/b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
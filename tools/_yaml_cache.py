@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+OpenAPI YAML 解析結果のキャッシュ
+
+同じ内容のYAMLを繰り返し解析しないよう、解析済みの仕様をメモリ上に保持します。
+返される辞書はキャッシュと共有されるため、呼び出し側で変更してはいけません。
+"""
+
+import functools
+import hashlib
+import yaml
+from typing import Dict, Any
+
+# libyaml が利用可能な場合はC実装のローダーを使用する（未導入時は純Python版にフォールバック）
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# 差分検出・影響分析で使用するトップレベルのキー（components は schemas のみ使用する）
+_SPEC_KEYS = frozenset({"openapi", "paths", "components"})
+
+
+def _is_key(loader, key_node: yaml.Node, keys) -> bool:
+    """マッピングのキーノードが指定されたキーのいずれかであるかを判定する"""
+    if not isinstance(key_node, yaml.ScalarNode):
+        return False
+    key = loader.construct_object(key_node)
+    return isinstance(key, str) and key in keys
+
+
+def fast_load_openapi(content: str) -> Dict[str, Any]:
+    """
+    OpenAPI YAMLから差分検出・影響分析に必要な部分だけを解析する
+
+    ドキュメント全体をノードに変換した後、'openapi'、'paths'、'components.schemas'
+    以外のサブツリー（info、tags、拡張フィールドなど）はPythonオブジェクトを構築せずに読み捨てる。
+
+    Args:
+        content: YAML内容
+
+    Returns:
+        解析されたYAMLの内容（トップレベルがマッピングでない場合はドキュメント全体）
+
+    Raises:
+        yaml.YAMLError: YAMLの解析に失敗した場合
+    """
+    loader = _YamlLoader(content)
+    try:
+        node = loader.get_single_node()
+        if node is None:
+            return None
+        if not isinstance(node, yaml.MappingNode):
+            return loader.construct_document(node)
+
+        # マージキー（<<）を展開してからキーを選別する
+        loader.flatten_mapping(node)
+        spec = {}
+        for key_node, value_node in node.value:
+            if not _is_key(loader, key_node, _SPEC_KEYS):
+                continue
+
+            key = loader.construct_object(key_node)
+            if key == "components" and isinstance(value_node, yaml.MappingNode):
+                loader.flatten_mapping(value_node)
+                value_node = yaml.MappingNode(
+                    value_node.tag,
+                    [(k, v) for k, v in value_node.value if _is_key(loader, k, ("schemas",))],
+                    value_node.start_mark,
+                    value_node.end_mark,
+                    value_node.flow_style
+                )
+            spec[key] = loader.construct_object(value_node)
+
+        # construct_document と同様に、遅延されたサブツリーの構築を完了させる
+        while loader.state_generators:
+            state_generators = loader.state_generators
+            loader.state_generators = []
+            for generator in state_generators:
+                for _ in generator:
+                    pass
+
+        return spec
+    finally:
+        loader.dispose()
+
+
+@functools.lru_cache(maxsize=32)
+def parse_spec(content_hash: bytes, content: str) -> Dict[str, Any]:
+    """
+    YAML内容を解析する（結果はキャッシュされる）
+
+    Args:
+        content_hash: YAML内容のハッシュ値
+        content: YAML内容
+
+    Returns:
+        解析されたYAMLの内容
+
+    Raises:
+        yaml.YAMLError: YAMLの解析に失敗した場合
+    """
+    return fast_load_openapi(content)
+
+
+def load_spec(content: str) -> Dict[str, Any]:
+    """
+    YAML内容のハッシュ値を計算し、キャッシュを利用して解析する
+
+    Args:
+        content: YAML内容
+
+    Returns:
+        解析されたYAMLの内容
+
+    Raises:
+        yaml.YAMLError: YAMLの解析に失敗した場合
+    """
+    content_hash = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+    return parse_spec(content_hash, content)
@@ -1,11 +1,54 @@
 #!/usr/bin/env python3
 import yaml
-import json
-from typing import Dict, Any, List, Set
+import functools
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Set
+from ._yaml_cache import load_spec
+
+# .get() のデフォルト値として共有する空の辞書（読み取り専用として扱うこと）
+_EMPTY = {}
+
+# 解析対象とするHTTPメソッド（$refやparametersなどの特殊キーは含まない）
+_HTTP_METHODS = frozenset({'get', 'post', 'put', 'delete', 'patch', 'options', 'head', 'trace'})
+
+# サブスキーマを組み合わせるキーワード
+_COMPOSITE_KEYS = ("allOf", "oneOf", "anyOf")
+
+# 仕様ごとのキャッシュを保持する最大件数（解析済みYAMLのキャッシュと同じ件数）
+_SPEC_CACHE_SIZE = 32
+
+# components.schemas への参照の接頭辞
+_SCHEMA_REF_PREFIX = "#/components/schemas/"
+
+
+@functools.lru_cache(maxsize=4096)
+def _ref_to_schema_name(ref: str) -> str:
+    """
+    $ref の値から参照先のスキーマ名を抽出する
+    
+    同じ参照文字列は仕様内で何度も現れるため、文字列の分割結果をキャッシュする。
+    
+    Args:
+        ref: $ref の値
+        
+    Returns:
+        スキーマ名（components.schemas への参照でない場合は空文字列）
+    """
+    # '#/components/schemas/SchemaName' 形式から 'SchemaName' を抽出
+    if ref.startswith(_SCHEMA_REF_PREFIX):
+        return ref.split("/")[-1]
+    return ""
+
 
 class OpenAPIAnalyzer:
     """OpenAPI仕様の分析を行うクラス"""
     
+    def __init__(self):
+        # 仕様オブジェクトのidをキーとした、スキーマ依存グラフと参照スキーマ収集結果のキャッシュ
+        self._spec_caches = OrderedDict()
+        self._spec_caches_lock = threading.Lock()
+    
     def analyze_schema_impact(self, yaml_content: str, schema_name: str) -> Dict[str, Any]:
         """
         指定されたスキーマが影響するAPIエンドポイントを特定する
@@ -18,9 +61,24 @@ class OpenAPIAnalyzer:
             影響を受けるAPIエンドポイントと詳細情報を含む辞書
         """
         try:
-            spec = yaml.safe_load(yaml_content) or {}
+            spec = load_spec(yaml_content) or {}
         except yaml.YAMLError as e:
-            return {"error": f"YAML解析エラー: {str(e)}"}        # 分析結果を格納する辞書
+            return {"error": f"YAML解析エラー: {str(e)}"}
+        
+        return self._analyze_spec_schema_impact(spec, schema_name)
+    
+    def _analyze_spec_schema_impact(self, spec: Dict[str, Any], schema_name: str) -> Dict[str, Any]:
+        """
+        解析済みのOpenAPI仕様に対して、指定されたスキーマが影響するAPIエンドポイントを特定する
+        
+        Args:
+            spec: 解析済みのOpenAPI仕様
+            schema_name: 分析対象のスキーマ名
+            
+        Returns:
+            影響を受けるAPIエンドポイントと詳細情報を含む辞書
+        """
+        # 分析結果を格納する辞書
         result = {
             "schema_name": schema_name,
             "affected_endpoints": [],
@@ -37,40 +95,41 @@ class OpenAPIAnalyzer:
             
         paths = spec.get("paths", {})
         
+        # 各スキーマオブジェクトから参照されるスキーマ名は仕様ごとに一度だけ収集する
+        spec_cache = self._get_spec_cache(spec)
+        
         # 各パスとそのHTTPメソッドを調査
         for path, path_item in paths.items():
-            for method, operation in path_item.items():                # HTTPメソッドのみを処理（$refなどの特殊キーは除外）
-                if method not in ['get', 'post', 'put', 'delete', 'patch', 'options', 'head', 'trace']:
+            for method, operation in path_item.items():
+                # HTTPメソッドのみを処理（$refなどの特殊キーは除外）
+                if method not in _HTTP_METHODS:
                     continue
                     
-                endpoint_affected = False
-                usage_info = {
-                    "path": path,
-                    "method": method.upper(),
-                    "operation_id": operation.get("operationId", ""),
-                    "summary": operation.get("summary", ""),
-                    "description": operation.get("description", ""),
-                    "usage_locations": []
-                }
+                # オペレーション単位で共通の値は一度だけ取得する
+                method_upper = method.upper()
+                op_summary = operation.get("summary", "")
+                op_desc = operation.get("description", "")
+                
+                # エンドポイント情報は影響がある場合にだけ組み立てる
+                usage_locations = []
                 
                 # リクエストボディでのスキーマ使用を確認
                 if "requestBody" in operation:
                     request_body = operation["requestBody"]
-                    content = request_body.get("content", {})
+                    content = request_body.get("content", _EMPTY)
                     
                     for mime_type, mime_info in content.items():
-                        schema_ref = self._get_schema_ref(mime_info.get("schema", {}))
+                        schema_obj = mime_info.get("schema", _EMPTY)
                         
-                        if schema_ref == schema_name or self._is_schema_used_in_object(mime_info.get("schema", {}), schema_name, spec, set()):
-                            endpoint_affected = True
-                            usage_info["usage_locations"].append("requestBody")
+                        if schema_name in self._collect_refs_deep(schema_obj, spec_cache):
+                            usage_locations.append("requestBody")
                             result["usage_details"]["request_body"].append({
                                 "path": path,
-                                "method": method.upper(),
+                                "method": method_upper,
                                 "mime_type": mime_type,
                                 "description": request_body.get("description", ""),
-                                "summary": operation.get("summary", ""),
-                                "operation_description": operation.get("description", "")
+                                "summary": op_summary,
+                                "operation_description": op_desc
                             })
                 
                 # レスポンスでのスキーマ使用を確認
@@ -78,45 +137,50 @@ class OpenAPIAnalyzer:
                     responses = operation["responses"]
                     
                     for status_code, response in responses.items():
-                        content = response.get("content", {})
+                        content = response.get("content", _EMPTY)
                         
                         for mime_type, mime_info in content.items():
-                            schema_ref = self._get_schema_ref(mime_info.get("schema", {}))
+                            schema_obj = mime_info.get("schema", _EMPTY)
                             
-                            if schema_ref == schema_name or self._is_schema_used_in_object(mime_info.get("schema", {}), schema_name, spec, set()):
-                                endpoint_affected = True
-                                usage_info["usage_locations"].append(f"response ({status_code})")
+                            if schema_name in self._collect_refs_deep(schema_obj, spec_cache):
+                                usage_locations.append(f"response ({status_code})")
                                 result["usage_details"]["response"].append({
                                     "path": path,
-                                    "method": method.upper(),
+                                    "method": method_upper,
                                     "status_code": status_code,
                                     "mime_type": mime_type,
                                     "description": response.get("description", ""),
-                                    "summary": operation.get("summary", ""),
-                                    "operation_description": operation.get("description", "")
+                                    "summary": op_summary,
+                                    "operation_description": op_desc
                                 })
                 
                 # パラメータでのスキーマ使用を確認
-                parameters = operation.get("parameters", [])
+                parameters = operation.get("parameters", ())
                 for param in parameters:
-                    schema_ref = self._get_schema_ref(param.get("schema", {}))
+                    schema_obj = param.get("schema", _EMPTY)
                     
-                    if schema_ref == schema_name or self._is_schema_used_in_object(param.get("schema", {}), schema_name, spec, set()):
-                        endpoint_affected = True
-                        usage_info["usage_locations"].append(f"parameter ({param.get('name', '')})")
+                    if schema_name in self._collect_refs_deep(schema_obj, spec_cache):
+                        usage_locations.append(f"parameter ({param.get('name', '')})")
                         result["usage_details"]["parameters"].append({
                             "path": path,
-                            "method": method.upper(),
+                            "method": method_upper,
                             "parameter_name": param.get("name", ""),
                             "parameter_in": param.get("in", ""),
                             "description": param.get("description", ""),
-                            "summary": operation.get("summary", ""),
-                            "operation_description": operation.get("description", "")
+                            "summary": op_summary,
+                            "operation_description": op_desc
                         })
                 
                 # このエンドポイントが影響を受ける場合、結果に追加
-                if endpoint_affected:
-                    result["affected_endpoints"].append(usage_info)
+                if usage_locations:
+                    result["affected_endpoints"].append({
+                        "path": path,
+                        "method": method_upper,
+                        "operation_id": operation.get("operationId", ""),
+                        "summary": op_summary,
+                        "description": op_desc,
+                        "usage_locations": usage_locations
+                    })
                     
         return result
     
@@ -142,9 +206,17 @@ class OpenAPIAnalyzer:
             "removed_schemas": {}
         }
         
+        # YAMLはスキーマごとではなく一度だけ解析し、全スキーマの分析で共有する
+        try:
+            spec = load_spec(yaml_content) or {}
+            parse_error = None
+        except yaml.YAMLError as e:
+            spec = None
+            parse_error = {"error": f"YAML解析エラー: {str(e)}"}
+        
         # 各変更されたスキーマについて影響分析を行う
         for schema_name in modified_schemas:
-            schema_impact = self.analyze_schema_impact(yaml_content, schema_name)
+            schema_impact = self._analyze_spec_schema_impact(spec, schema_name) if spec is not None else parse_error
             result["modified_schemas"][schema_name] = {
                 "changes": modified_schemas[schema_name],
                 "impact": schema_impact
@@ -152,7 +224,7 @@ class OpenAPIAnalyzer:
         
         # 各追加されたスキーマについて影響分析を行う
         for schema_name in added_schemas:
-            schema_impact = self.analyze_schema_impact(yaml_content, schema_name)
+            schema_impact = self._analyze_spec_schema_impact(spec, schema_name) if spec is not None else parse_error
             result["added_schemas"][schema_name] = {
                 "schema": added_schemas[schema_name],
                 "impact": schema_impact
@@ -181,111 +253,201 @@ class OpenAPIAnalyzer:
             スキーマ名（参照がない場合は空文字列）
         """
         if "$ref" in schema:
-            ref = schema["$ref"]
-            # '#/components/schemas/SchemaName' 形式から 'SchemaName' を抽出
-            if ref.startswith("#/components/schemas/"):
-                return ref.split("/")[-1]
+            return _ref_to_schema_name(schema["$ref"])
         return ""
-    def _is_schema_used_in_object(self, schema: Dict[str, Any], target_schema: str, full_spec: Dict[str, Any], visited_refs: Set[str] = None) -> bool:
+    def _collect_direct_refs(self, schema: Dict[str, Any], refs: Set[str]) -> None:
         """
-        スキーマオブジェクト内で特定のスキーマが使用されているかを再帰的に確認する
+        スキーマオブジェクトが直接参照しているスキーマ名を収集する（$ref の参照先は辿らない）
+        
+        再帰呼び出しの代わりに明示的なスタックで走査するため、深いスキーマでも
+        再帰の上限に達しない。YAMLのエイリアスで共有・循環しているオブジェクトは一度だけ調べる。
         
         Args:
             schema: 調査対象のスキーマオブジェクト
-            target_schema: 検索対象のスキーマ名
-            full_spec: OpenAPI仕様全体
-            visited_refs: すでに調査済みの参照スキーマ名のセット
-            
-        Returns:
-            スキーマが使用されている場合はTrue、そうでない場合はFalse
+            refs: 参照されているスキーマ名を追加するセット
         """
-        # 訪問済みスキーマを追跡するセットの初期化
-        if visited_refs is None:
-            visited_refs = set()
-            
-        # 辞書以外のスキーマは処理しない
-        if not isinstance(schema, dict):
-            return False
+        stack = [schema]
+        visited = set()
+        
+        while stack:
+            node = stack.pop()
+            if not isinstance(node, dict) or id(node) in visited:
+                continue
+            visited.add(id(node))
             
-        # 直接の参照をチェック
-        schema_ref = self._get_schema_ref(schema)
-        if schema_ref == target_schema:
-            return True
+            schema_ref = self._get_schema_ref(node)
+            if schema_ref:
+                refs.add(schema_ref)
+                
+            schema_type = node.get("type")
+            if schema_type == "object":
+                if "properties" in node:
+                    stack.extend(node["properties"].values())
+            elif schema_type == "array":
+                if "items" in node:
+                    stack.append(node["items"])
             
-        # スキーマがオブジェクトタイプの場合、プロパティを調査
-        if schema.get("type") == "object" and "properties" in schema:
-            for _, prop_schema in schema["properties"].items():
-                if self._is_schema_used_in_object(prop_schema, target_schema, full_spec, visited_refs):
-                    return True
+            for composite_key in _COMPOSITE_KEYS:
+                if composite_key in node:
+                    stack.extend(node[composite_key])
+    
+    def _build_schema_dep_graph(self, spec: Dict[str, Any]) -> Dict[str, Set[str]]:
+        """
+        components.schemas 間の依存グラフを構築する
         
-        # スキーマが配列タイプの場合、items を調査
-        if schema.get("type") == "array" and "items" in schema:
-            if self._is_schema_used_in_object(schema["items"], target_schema, full_spec, visited_refs):
-                return True
+        Args:
+            spec: OpenAPI仕様全体
+            
+        Returns:
+            スキーマ名をキー、そのスキーマが直接参照しているスキーマ名のセットを値とする辞書
+        """
+        schemas = (spec.get("components") or _EMPTY).get("schemas") or _EMPTY
+        deps = {}
         
-        # スキーマが$refを持つ場合、その参照先を再帰的に調査（循環参照防止）
-        if schema_ref and schema_ref != target_schema:
-            # 既に訪問済みのスキーマはスキップ
-            if schema_ref in visited_refs:
-                return False
-                
-            # 訪問済みとしてマーク
-            visited_refs.add(schema_ref)
+        for name, schema in schemas.items():
+            refs = set()
+            self._collect_direct_refs(schema, refs)
+            deps[name] = refs
             
-            ref_schema = full_spec.get("components", {}).get("schemas", {}).get(schema_ref, {})
-            if ref_schema:
-                if self._is_schema_used_in_object(ref_schema, target_schema, full_spec, visited_refs):
-                    return True
+        return deps
+    
+    def _get_spec_cache(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        仕様ごとのキャッシュを取得する（存在しない場合は作成する）
         
-        # allOf, oneOf, anyOf をチェック
-        for composite_key in ["allOf", "oneOf", "anyOf"]:
-            if composite_key in schema:
-                for sub_schema in schema[composite_key]:
-                    if self._is_schema_used_in_object(sub_schema, target_schema, full_spec, visited_refs):
-                        return True
+        解析済みYAMLのキャッシュにより同じ内容の仕様は同じオブジェクトになるため、
+        オブジェクトのidをキーにする。キャッシュは仕様オブジェクトを保持するので、
+        エントリが残っている間にidが別の仕様に再利用されることはない。
+        
+        Args:
+            spec: OpenAPI仕様全体
+            
+        Returns:
+            依存グラフと参照スキーマの収集結果を保持する辞書
+        """
+        key = id(spec)
+        with self._spec_caches_lock:
+            cache = self._spec_caches.get(key)
+            if cache is not None:
+                self._spec_caches.move_to_end(key)
+                return cache
+                
+        cache = {
+            "spec": spec,
+            "deps": self._build_schema_dep_graph(spec),
+            # スキーマ名 -> 推移的に参照されるスキーマ名のセット
+            "reachable": {},
+            # スキーマオブジェクトのid -> 参照されるスキーマ名のセット（specを保持しているためidは再利用されない）
+            "object_refs": {}
+        }
         
-        return False
+        with self._spec_caches_lock:
+            self._spec_caches[key] = cache
+            self._spec_caches.move_to_end(key)
+            # 古い仕様のキャッシュを破棄する
+            while len(self._spec_caches) > _SPEC_CACHE_SIZE:
+                self._spec_caches.popitem(last=False)
+        return cache
     
-    def _get_schema_description(self, spec: Dict[str, Any], schema_name: str) -> Dict[str, Any]:
+    def _collect_refs_deep(self, schema: Dict[str, Any], spec_cache: Dict[str, Any]) -> Set[str]:
         """
-        スキーマ名から説明などの詳細情報を取得する
+        スキーマオブジェクトから直接または間接的に参照されているスキーマ名をすべて取得する
+        
+        結果はスキーマオブジェクトごとにキャッシュするため、対象スキーマを変えて
+        何度問い合わせても各オブジェクトの走査は一度だけで済む。
         
         Args:
-            spec: OpenAPI仕様全体
-            schema_name: 検索対象のスキーマ名
+            schema: 調査対象のスキーマオブジェクト
+            spec_cache: 仕様ごとのキャッシュ
             
         Returns:
-            スキーマの詳細情報を含む辞書
+            参照されているスキーマ名のセット
         """
-        schema = spec.get("components", {}).get("schemas", {}).get(schema_name, {})
+        object_refs = spec_cache["object_refs"]
+        refs = object_refs.get(id(schema))
+        if refs is not None:
+            return refs
+            
+        direct_refs = set()
+        self._collect_direct_refs(schema, direct_refs)
         
-        return {
-            "title": schema.get("title", ""),
-            "description": schema.get("description", ""),
-            "type": schema.get("type", ""),
-            "properties": self._get_properties_with_descriptions(schema),
-            "required": schema.get("required", [])
-        }
+        refs = set(direct_refs)
+        for ref in direct_refs:
+            refs |= self._get_reachable_schemas(ref, spec_cache)
+            
+        object_refs[id(schema)] = refs
+        return refs
     
-    def _get_properties_with_descriptions(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+    def _get_reachable_schemas(self, schema_name: str, spec_cache: Dict[str, Any]) -> Set[str]:
         """
-        スキーマのプロパティから説明を含む情報を取得する
+        スキーマから推移的に参照されているスキーマ名を依存グラフから取得する
+        
+        Tarjanのアルゴリズムで強連結成分（循環参照しているスキーマ群）を求め、
+        成分単位で到達可能なスキーマのセットを一度だけ計算して共有する。
+        返されるセットは複数のスキーマで共有されるため、呼び出し側で変更してはいけない。
         
         Args:
-            schema: スキーマオブジェクト
+            schema_name: 起点のスキーマ名
+            spec_cache: 仕様ごとのキャッシュ
             
         Returns:
-            プロパティ名と説明を含む辞書
+            参照されているスキーマ名のセット（循環参照がある場合は起点自身も含む）
         """
-        properties = {}
+        reachable = spec_cache["reachable"]
+        if schema_name in reachable:
+            return reachable[schema_name]
+            
+        deps = spec_cache["deps"]
+        index = {schema_name: 0}
+        lowlink = {schema_name: 0}
+        scc_stack = [schema_name]
+        on_stack = {schema_name}
+        # 再帰の代わりに (スキーマ名, 未処理の参照先イテレータ) のスタックで深さ優先探索する
+        work = [(schema_name, iter(deps.get(schema_name, ())))]
         
-        if "properties" in schema:
-            for prop_name, prop_schema in schema["properties"].items():
-                properties[prop_name] = {
-                    "type": prop_schema.get("type", ""),
-                    "description": prop_schema.get("description", ""),
-                    "format": prop_schema.get("format", ""),
-                    "example": prop_schema.get("example", "")
-                }
-                
-        return properties
\ No newline at end of file
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child in reachable:
+                    # 以前の呼び出しで計算済み
+                    continue
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    scc_stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(deps.get(child, ()))))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    
+                if lowlink[node] == index[node]:
+                    # 強連結成分を取り出す
+                    members = set()
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack.discard(member)
+                        members.add(member)
+                        if member == node:
+                            break
+                            
+                    # 成分外の参照先は逆トポロジカル順で先に確定している
+                    component_reach = set()
+                    for member in members:
+                        for child in deps.get(member, ()):
+                            component_reach.add(child)
+                            if child not in members:
+                                component_reach |= reachable[child]
+                                
+                    for member in members:
+                        reachable[member] = component_reach
+                        
+        return reachable[schema_name]
+
+
+# MCPツールの呼び出し間でキャッシュを共有するための既定のインスタンス
+_DEFAULT_ANALYZER = OpenAPIAnalyzer()
@@ -1,15 +1,242 @@
 #!/usr/bin/env python3
 import yaml
-import json
 import os
-import tempfile
-import shutil
+import threading
+from collections import OrderedDict
 from git import Repo
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+from ._yaml_cache import load_spec
+
+# pygit2（libgit2バインディング）はオプション。利用可能ならgitプロセスを起動せずにオブジェクトを読み出す
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+# Blobを指すエントリのファイルモード（通常ファイル、実行可能ファイル、シンボリックリンク）
+_BLOB_MODES = frozenset({0o100644, 0o100755, 0o120000})
+
+# 空のツリーのID（HEADがまだコミットを指していない場合の比較対象）
+_EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+# スレッドごとに保持するGitリポジトリの最大件数
+_REPO_CACHE_SIZE = 8
+
+
+def _split_keys(before: Dict[str, Any], after: Dict[str, Any]):
+    """
+    2つの辞書のキーを追加・削除・共通に分類する
+    
+    差分の判定は辞書ビューの集合演算で行い、結果は元の辞書の記述順に並べて返す。
+    追加・削除がない場合（最も多いケース）はPythonレベルのループを行わない。
+    
+    Args:
+        before: 変更前の辞書
+        after: 変更後の辞書
+        
+    Returns:
+        (追加されたキー, 削除されたキー, 共通のキー) のタプル
+    """
+    added = after.keys() - before.keys()
+    removed = before.keys() - after.keys()
+    
+    added_keys = [key for key in after if key in added] if added else []
+    if removed:
+        removed_keys = [key for key in before if key in removed]
+        common_keys = [key for key in before if key not in removed]
+    else:
+        removed_keys = []
+        common_keys = list(before)
+        
+    return added_keys, removed_keys, common_keys
+
+class _Repo:
+    """
+    Gitリポジトリからファイル内容を読み出すラッパー
+    
+    pygit2 が利用可能な場合はlibgit2でパックファイルを直接読み出し、
+    そうでない場合はGitPythonにフォールバックする。
+    """
+    
+    def __init__(self, repo_path: str):
+        """
+        Args:
+            repo_path: Gitリポジトリのパス
+        """
+        if pygit2 is not None:
+            self._pygit2 = pygit2.Repository(repo_path)
+            self._git = None
+            # ベアリポジトリでは作業ツリーがないため None とする（GitPythonと同じ扱い）
+            workdir = self._pygit2.workdir
+            self.working_tree_dir = os.path.normpath(workdir) if workdir else None
+        else:
+            self._pygit2 = None
+            self._git = Repo(repo_path)
+            self.working_tree_dir = self._git.working_tree_dir
+    
+    def close(self):
+        """
+        リポジトリが保持するリソースを解放する
+        
+        GitPythonが起動した git cat-file プロセスを終了させる。
+        """
+        if self._git is not None:
+            self._git.close()
+    
+    def relative_path(self, path: str) -> str:
+        """
+        ファイルのパスをリポジトリのルートからの相対パス（'/' 区切り）に変換する
+        
+        Gitのツリーやインデックスのキーとして使用できるよう、'./' や '..' を含むパスも正規化する。
+        
+        Args:
+            path: ファイルのパス（絶対パス、またはリポジトリのルートからの相対パス）
+            
+        Returns:
+            リポジトリのルートからの相対パス
+            
+        Raises:
+            ValueError: パスがリポジトリの外を指している場合
+        """
+        if os.path.isabs(path):
+            if self.working_tree_dir is None:
+                raise ValueError(f"作業ツリーのないリポジトリでは絶対パス '{path}' を使用できません")
+            path = os.path.relpath(path, self.working_tree_dir)
+            
+        rel_path = os.path.normpath(path).replace(os.sep, "/")
+        if rel_path == ".." or rel_path.startswith("../"):
+            raise ValueError(f"ファイル '{path}' はリポジトリの外にあります")
+        return rel_path
+    
+    def read_file(self, rev: str, path: str) -> Optional[str]:
+        """
+        指定されたリビジョンのファイル内容を取得する
+        
+        Args:
+            rev: リビジョン（コミットハッシュなど）
+            path: リポジトリのルートからの相対パス
+            
+        Returns:
+            ファイルの内容（リビジョンにファイルが存在しない、またはファイルでない場合はNone）
+        """
+        if self._pygit2 is not None:
+            tree = self._pygit2.revparse_single(rev).peel(pygit2.Tree)
+            try:
+                entry = tree[path]
+            except KeyError:
+                return None
+            # ディレクトリやサブモジュールはファイルが存在しないものとして扱う
+            if entry.type_str != "blob":
+                return None
+            return self._pygit2[entry.id].data.decode("utf-8")
+            
+        tree = self._git.commit(rev).tree
+        try:
+            blob = tree / path
+        except KeyError:
+            return None
+        if blob.type != "blob":
+            return None
+        return blob.data_stream.read().decode("utf-8")
+    
+    def staged_blob_ids(self, path: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """
+        HEADとインデックスの間でファイルが変更されている場合に、両者のBlob IDを取得する
+        
+        内容が同一でもファイルモードが変更されていれば、ステージングされた変更として扱う。
+        
+        Args:
+            path: リポジトリのルートからの相対パス
+            
+        Returns:
+            (HEADのBlob ID, インデックスのBlob ID) のタプル（存在しない、またはファイルでない側はNone）。
+            変更がステージングされていない場合はNone
+        """
+        if self._pygit2 is not None:
+            # インデックスは呼び出しごとに読み直す（他のプロセスによるステージングを反映するため）
+            index = self._pygit2.index
+            index.read(False)
+            try:
+                entry = index[path]
+                staged = (str(entry.id), entry.mode) if entry.mode in _BLOB_MODES else None
+            except KeyError:
+                staged = None
+                
+            try:
+                entry = self._pygit2.head.peel(pygit2.Tree)[path]
+                head = (str(entry.id), entry.filemode) if entry.type_str == "blob" else None
+            except (KeyError, pygit2.GitError):
+                head = None
+                
+            if staged == head:
+                return None
+            return (head[0] if head else None, staged[0] if staged else None)
+            
+        # git diff-index でパスを絞り込み、HEADとインデックスのBlob IDを1回のプロセス起動で取得する
+        # （GitPythonの repo.index はインデックス全体を読み込むため、大きなリポジトリでは遅い）
+        base = "HEAD" if self._git.head.is_valid() else _EMPTY_TREE
+        output = self._git.git.diff_index("--cached", "-z", base, "--", f":(literal){path}")
+        fields = output.split("\0")
+        for header, changed_path in zip(fields[::2], fields[1::2]):
+            if changed_path != path:
+                continue
+            # ':<HEADのモード> <インデックスのモード> <HEADのID> <インデックスのID> <状態>'
+            head_mode, staged_mode, head_id, staged_id = header.lstrip(":").split()[:4]
+            return (
+                head_id if int(head_mode, 8) in _BLOB_MODES else None,
+                staged_id if int(staged_mode, 8) in _BLOB_MODES else None
+            )
+        return None
+    
+    def read_blob(self, blob_id: str) -> str:
+        """
+        Blobの内容を文字列として読み込む
+        
+        Args:
+            blob_id: Blob ID
+            
+        Returns:
+            ファイルの内容
+        """
+        if self._pygit2 is not None:
+            return self._pygit2[blob_id].data.decode("utf-8")
+            
+        # GitPythonが保持する git cat-file --batch プロセスから読み出す
+        return self._git.git.get_object_data(blob_id)[3].decode("utf-8")
+    
+    def first_commit_with_file(self, path: str) -> str:
+        """
+        指定されたファイルが最初に登場するコミットハッシュを取得する
+        
+        Args:
+            path: リポジトリのルートからの相対パス
+            
+        Returns:
+            最初のコミットハッシュ、またはファイルが見つからない場合は空文字列
+        """
+        if self._pygit2 is not None:
+            # 古いコミットから順に辿り、最初にファイルを含むコミットを返す
+            walker = self._pygit2.walk(self._pygit2.head.target, pygit2.GIT_SORT_TOPOLOGICAL | pygit2.GIT_SORT_REVERSE)
+            for commit in walker:
+                if path in commit.tree:
+                    return str(commit.id)
+            return ""
+            
+        # ファイルが追加されたコミットだけを取得し、最も古いもの（出力の最終行）を返す
+        # （--reverse は --max-count の適用後に並べ替えるため、併用すると最新のコミットになる）
+        log_output = self._git.git.log("--diff-filter=A", "--format=%H", "--", path)
+        commits = log_output.strip().split("\n")
+        
+        return commits[-1]
+
 
 class OpenAPIDiffer:
     """OpenAPI仕様の差分を分析するクラス"""
     
+    def __init__(self):
+        # スレッドごとに保持するGitリポジトリのキャッシュ（LRU）
+        self._local = threading.local()
+    
     def _is_valid_openapi(self, data: Dict[str, Any]) -> bool:
         """
         与えられたデータがOpenAPI仕様として有効かどうかを検証する
@@ -45,8 +272,8 @@ class OpenAPIDiffer:
             ValueError: 有効なOpenAPI仕様が含まれていない場合
         """
         try:
-            before = yaml.safe_load(before_yaml) or {}
-            after = yaml.safe_load(after_yaml) or {}
+            before = load_spec(before_yaml) or {}
+            after = load_spec(after_yaml) or {}
         except yaml.YAMLError as e:
             raise ValueError(f"YAML解析エラー: {str(e)}")
           # ファイルが存在しない場合や空の場合は空の辞書として扱う
@@ -103,48 +330,33 @@ class OpenAPIDiffer:
             差分情報を含む辞書
             
         Raises:
-            ValueError: 指定されたリビジョンにファイルが存在しない場合
+            ValueError: ファイルのパスが不正な場合、またはファイルの取得に失敗した場合
         """
-        repo = Repo(git_repo_path)
+        repo = self._get_repo(git_repo_path)
         
-        # 一時ディレクトリを作成
-        temp_dir = tempfile.mkdtemp()
+        # リポジトリのルートからの相対パスを取得
+        rel_path = repo.relative_path(yaml_path)
         
+        # 古いリビジョンのファイルを取得
         try:
-            # 古いリビジョンのファイルを取得（ファイルが存在しない場合は空のYAMLとして扱う）
-            try:
-                old_content = repo.git.show(f"{old_rev}:{yaml_path}")
-            except Exception as e:
-                if "does not exist" in str(e):
-                    # ファイルが存在しない場合は、新規追加されたものとして扱う
-                    old_content = "{}"
-                else:
-                    raise ValueError(f"古いリビジョンのファイル取得エラー: {str(e)}")
-            
-            old_file_path = os.path.join(temp_dir, "old.yaml")
-            with open(old_file_path, "w", encoding="utf-8") as f:
-                f.write(old_content)
-            
-            # 新しいリビジョンのファイルを取得
-            try:
-                new_content = repo.git.show(f"{new_rev}:{yaml_path}")
-            except Exception as e:
-                if "does not exist" in str(e):
-                    # ファイルが存在しない場合は、削除されたものとして扱う
-                    new_content = "{}"
-                else:
-                    raise ValueError(f"新しいリビジョンのファイル取得エラー: {str(e)}")
-                
-            new_file_path = os.path.join(temp_dir, "new.yaml")
-            with open(new_file_path, "w", encoding="utf-8") as f:
-                f.write(new_content)
-            
-            # 差分を比較
-            return self.compare(old_content, new_content)
+            old_content = repo.read_file(old_rev, rel_path)
+        except Exception as e:
+            raise ValueError(f"古いリビジョンのファイル取得エラー: {str(e)}")
+        if old_content is None:
+            # ファイルが存在しない場合は、新規追加されたものとして扱う
+            old_content = "{}"
+        
+        # 新しいリビジョンのファイルを取得
+        try:
+            new_content = repo.read_file(new_rev, rel_path)
+        except Exception as e:
+            raise ValueError(f"新しいリビジョンのファイル取得エラー: {str(e)}")
+        if new_content is None:
+            # ファイルが存在しない場合は、削除されたものとして扱う
+            new_content = "{}"
         
-        finally:
-            # 一時ディレクトリを削除
-            shutil.rmtree(temp_dir)
+        # 差分を比較
+        return self.compare(old_content, new_content)
         
     def compare_staged_changes(self, git_repo_path: str, yaml_path: str) -> Dict[str, Any]:
         """
@@ -160,87 +372,94 @@ class OpenAPIDiffer:
         Raises:
             ValueError: ファイルが存在しない、またはステージングされていない場合
         """
-        repo = Repo(git_repo_path)
+        repo = self._get_repo(git_repo_path)
         
         # リポジトリのルートからの相対パスを取得
-        repo_root = repo.git.rev_parse("--show-toplevel")
-        rel_path = os.path.relpath(yaml_path, repo_root) if os.path.isabs(yaml_path) else yaml_path
+        rel_path = repo.relative_path(yaml_path)
         
-        # 一時ディレクトリを作成
-        temp_dir = tempfile.mkdtemp()
+        # ステージングされているかチェックし、HEADとインデックスのBlob IDを取得（存在しない場合はNone）
+        blob_ids = repo.staged_blob_ids(rel_path)
+        if blob_ids is None:
+            raise ValueError(f"ファイル '{rel_path}' はステージングされていません")
+        head_id, staged_id = blob_ids
         
-        try:
-            # ステージングされているかチェック
-            staged_files = repo.git.diff("--cached", "--name-only").split("\n")
-            if rel_path not in staged_files:
-                raise ValueError(f"ファイル '{rel_path}' はステージングされていません")
-            
-            # HEADのコンテンツを取得（ファイルが存在しない場合は空のYAMLとして扱う）
-            try:
-                head_content = repo.git.show(f"HEAD:{rel_path}")
-            except Exception as e:
-                if "does not exist" in str(e):
-                    # ファイルが存在しない場合は、新規追加されたものとして扱う
-                    head_content = "{}"
-                else:
-                    raise ValueError(f"HEADからのファイル取得エラー: {str(e)}")
+        # HEADのコンテンツを取得（ファイルが存在しない場合は、新規追加されたものとして扱う）
+        head_content = repo.read_blob(head_id) if head_id is not None else "{}"
+        
+        # ステージングされたコンテンツを取得（削除がステージングされている場合は空のYAMLとして扱う）
+        staged_content = repo.read_blob(staged_id) if staged_id is not None else "{}"
+        
+        # 差分を比較
+        return self.compare(head_content, staged_content)
+    
+    def _get_repo(self, git_repo_path: str) -> _Repo:
+        """
+        Gitリポジトリを取得する（スレッドごとに最近使用したものを最大 _REPO_CACHE_SIZE 件キャッシュする）
+        
+        リポジトリを使い回すことで、オブジェクトの読み出しに使うlibgit2のキャッシュや
+        GitPythonが内部で起動する git cat-file --batch プロセスを呼び出し間で再利用する。
+        
+        Args:
+            git_repo_path: Gitリポジトリのパス
             
-            head_file_path = os.path.join(temp_dir, "head.yaml")
-            with open(head_file_path, "w", encoding="utf-8") as f:
-                f.write(head_content)
+        Returns:
+            Gitリポジトリ
+        """
+        repos = getattr(self._local, "repos", None)
+        if repos is None:
+            repos = self._local.repos = OrderedDict()
             
-            # ステージングされたコンテンツを取得
-            staged_content = repo.git.show(f":{rel_path}")
-            staged_file_path = os.path.join(temp_dir, "staged.yaml")
-            with open(staged_file_path, "w", encoding="utf-8") as f:
-                f.write(staged_content)
+        repo = repos.get(git_repo_path)
+        if repo is not None:
+            repos.move_to_end(git_repo_path)
+            return repo
             
-            # 差分を比較
-            return self.compare(head_content, staged_content)
+        repo = repos[git_repo_path] = _Repo(git_repo_path)
         
-        finally:
-            # 一時ディレクトリを削除
-            shutil.rmtree(temp_dir)
+        # 最も長く使われていないリポジトリを閉じ、子プロセスが残り続けないようにする
+        while len(repos) > _REPO_CACHE_SIZE:
+            _, evicted = repos.popitem(last=False)
+            evicted.close()
+        return repo
     
     def _detect_path_changes(self, before_paths, after_paths, diff_paths):
         """パスの変更を検出する"""
+        added, removed, common = _split_keys(before_paths, after_paths)
+        
         # 追加されたパス
-        for path in after_paths:
-            if path not in before_paths:
-                diff_paths["added"][path] = after_paths[path]
+        diff_paths["added"] = {path: after_paths[path] for path in added}
                 
         # 削除されたパス
-        for path in before_paths:
-            if path not in after_paths:
-                diff_paths["removed"][path] = before_paths[path]
+        diff_paths["removed"] = {path: before_paths[path] for path in removed}
                 
         # 変更されたパス
-        for path in before_paths:
-            if path in after_paths:
-                path_diff = self._compare_path_item(before_paths[path], after_paths[path])
-                if path_diff:
-                    diff_paths["modified"][path] = path_diff
+        for path in common:
+            path_diff = self._compare_path_item(before_paths[path], after_paths[path])
+            if path_diff:
+                diff_paths["modified"][path] = path_diff
+                
     def _detect_schema_changes(self, before_schemas, after_schemas, diff_schemas):
         """スキーマの変更を詳細に検出する（改善版）"""
+        added, removed, common = _split_keys(before_schemas, after_schemas)
+        
         # 追加されたスキーマ
-        for schema in after_schemas:
-            if schema not in before_schemas:
-                diff_schemas["added"][schema] = after_schemas[schema]
+        diff_schemas["added"] = {schema: after_schemas[schema] for schema in added}
                 
         # 削除されたスキーマ
-        for schema in before_schemas:
-            if schema not in after_schemas:
-                diff_schemas["removed"][schema] = before_schemas[schema]
+        diff_schemas["removed"] = {schema: before_schemas[schema] for schema in removed}
                 
         # 変更されたスキーマ
-        for schema in before_schemas:
-            if schema in after_schemas:
-                schema_diff = self._compare_schema_detail(before_schemas[schema], after_schemas[schema])
-                if schema_diff:
-                    diff_schemas["modified"][schema] = schema_diff
+        for schema in common:
+            schema_diff = self._compare_schema_detail(before_schemas[schema], after_schemas[schema])
+            if schema_diff:
+                diff_schemas["modified"][schema] = schema_diff
     
     def _compare_path_item(self, before_path, after_path):
         """パス項目の変更を詳細に比較する"""
+        # 変更のないパス項目はオペレーションごとの比較を省略する
+        if before_path == after_path:
+            return None
+            
         result = {
             "operations": {
                 "added": {},
@@ -304,39 +523,44 @@ class OpenAPIDiffer:
         before_props = before_schema.get("properties", {})
         after_props = after_schema.get("properties", {})
         
-        # 追加されたプロパティ
-        for prop in after_props:
-            if prop not in before_props:
-                changes["properties"]["added"][prop] = after_props[prop]
-                has_changes = True
-        
-        # 削除されたプロパティ
-        for prop in before_props:
-            if prop not in after_props:
-                changes["properties"]["removed"][prop] = before_props[prop]
+        # プロパティ全体が等しい場合は個別の比較を省略する
+        if before_props != after_props:
+            added_props, removed_props, common_props = _split_keys(before_props, after_props)
+            
+            # 追加されたプロパティ
+            if added_props:
+                changes["properties"]["added"] = {prop: after_props[prop] for prop in added_props}
                 has_changes = True
-        
-        # 変更されたプロパティ
-        for prop in before_props:
-            if prop in after_props and before_props[prop] != after_props[prop]:
-                changes["properties"]["modified"][prop] = {
-                    "before": before_props[prop],
-                    "after": after_props[prop]
-                }
+            
+            # 削除されたプロパティ
+            if removed_props:
+                changes["properties"]["removed"] = {prop: before_props[prop] for prop in removed_props}
                 has_changes = True
+            
+            # 変更されたプロパティ
+            for prop in common_props:
+                if before_props[prop] != after_props[prop]:
+                    changes["properties"]["modified"][prop] = {
+                        "before": before_props[prop],
+                        "after": after_props[prop]
+                    }
+                    has_changes = True
         
         # required属性の変更をチェック
         before_required = before_schema.get("required", [])
         after_required = after_schema.get("required", [])
         
-        for req in after_required:
-            if req not in before_required:
-                changes["required"]["added"].append(req)
-                has_changes = True
-        
-        for req in before_required:
-            if req not in after_required:
-                changes["required"]["removed"].append(req)
+        if before_required != after_required:
+            # 所属判定はハッシュセットで行い、結果の並びは元のリストの順序を保つ
+            before_required_set = frozenset(before_required)
+            after_required_set = frozenset(after_required)
+            
+            added_required = [req for req in after_required if req not in before_required_set]
+            removed_required = [req for req in before_required if req not in after_required_set]
+            
+            if added_required or removed_required:
+                changes["required"]["added"] = added_required
+                changes["required"]["removed"] = removed_required
                 has_changes = True
         
         return changes if has_changes else None
@@ -352,19 +576,15 @@ class OpenAPIDiffer:
         Returns:
             最初のコミットハッシュ、またはファイルが見つからない場合は空文字列
         """
-        repo = Repo(git_repo_path)
-        
-        # リポジトリのルートからの相対パスを取得
-        repo_root = repo.git.rev_parse("--show-toplevel")
-        rel_path = os.path.relpath(yaml_path, repo_root) if os.path.isabs(yaml_path) else yaml_path
+        repo = self._get_repo(git_repo_path)
         
         try:
-            # ファイルの履歴を逆順に取得（最も古いコミットを最後に）
-            log_output = repo.git.log("--reverse", "--format=%H", "--", rel_path)
-            commits = log_output.strip().split("\n")
-            
-            if commits and commits[0]:
-                return commits[0]
-            return ""
+            # リポジトリのルートからの相対パスを取得
+            rel_path = repo.relative_path(yaml_path)
+            return repo.first_commit_with_file(rel_path)
         except Exception:
             return ""
+
+
+# MCPツールの呼び出し間でGitリポジトリのキャッシュを共有するための既定のインスタンス
+_DEFAULT_DIFFER = OpenAPIDiffer()